@@ -1,10 +1,26 @@
+import hashlib
+import json
+import math
 import os
 import re
-from datetime import datetime, timezone
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
+import diskcache
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
 import plotly.express as px
 
 ALL_HEROES = [
@@ -15,9 +31,56 @@ ALL_HEROES = [
     "roadhog","sigma","sojourn","soldier-76","sombra","symmetra","torbjorn","tracer",
     "widowmaker","winston","wrecking-ball","zarya","zenyatta"
 ]
+ALL_HEROES_SET = frozenset(ALL_HEROES)
 
 DATA_DIR = "data"
-SNAP_FILE = os.path.join(DATA_DIR, "snapshots.csv")
+# Append-only Parquet dataset: one part file (one row group) per saved snapshot
+SNAP_DIR = os.path.join(DATA_DIR, "snapshots")
+LEGACY_SNAP_FILE = os.path.join(DATA_DIR, "snapshots.csv")
+SNAP_COMPACT_AT = 64  # merge per-save parts once a save pushes their count past this
+
+SNAP_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.timestamp("ns", tz="UTC")),
+        ("battletag", pa.string()),
+        ("player_id", pa.string()),
+        ("gamemode", pa.string()),
+        ("platform", pa.string()),
+        ("hero", pa.string()),
+        ("games_played", pa.float64()),
+        ("games_won", pa.float64()),
+        ("games_lost", pa.float64()),
+        ("time_played_sec", pa.float64()),
+        ("eliminations", pa.float64()),
+        ("deaths", pa.float64()),
+        ("hero_damage_done", pa.float64()),
+        ("healing_done", pa.float64()),
+    ]
+)
+SNAP_COLUMNS = SNAP_SCHEMA.names
+
+# In-memory dtypes: low-cardinality strings as categories, counters as nullable Int32.
+# Damage/healing stay float64: career totals pass 2**24, where float32 starts rounding.
+SNAP_DTYPES = {
+    "battletag": "category",
+    "player_id": "category",
+    "gamemode": "category",
+    "platform": "category",
+    "hero": "category",
+    "games_played": "Int32",
+    "games_won": "Int32",
+    "games_lost": "Int32",
+    "time_played_sec": "Int32",
+    "eliminations": "Int32",
+    "deaths": "Int32",
+}
+
+# A snapshot row's identity and the stats compared when deduping saves
+SNAP_KEY = ["player_id", "gamemode", "platform", "hero"]
+SNAP_STATS = [
+    "games_played", "games_won", "games_lost", "time_played_sec",
+    "eliminations", "deaths", "hero_damage_done", "healing_done",
+]
 
 st.set_page_config(page_title="Overwatch Stat Tracker", page_icon="🎯", layout="wide")
 
@@ -36,32 +99,93 @@ def battletag_to_player_id(btag: str) -> str:
     # Name#1234 -> Name-1234
     return btag.strip().replace("#", "-")
 
-import time
-import requests
-
-def overfast_get(path: str, params=None, max_retries: int = 5):
-    base = "https://overfast-api.tekrop.fr"
-    url = f"{base}{path}"
-    headers = {"User-Agent": "OW-Stats-Streamlit/1.0"}
-
-    delay = 1.0
-    for attempt in range(max_retries):
-        r = requests.get(url, params=params or {}, headers=headers, timeout=20)
-
-        if r.status_code != 429:
-            r.raise_for_status()
-            return r.json()
-
-        retry_after = r.headers.get("Retry-After")
-        wait_s = float(retry_after) if retry_after and retry_after.isdigit() else delay
-        time.sleep(wait_s)
-
-        delay = min(delay * 2, 30)
-
-    raise requests.HTTPError(f"429 Too Many Requests (gave up after {max_retries} retries): {url}")
+OVERFAST_BASE = "https://overfast-api.tekrop.fr"
+API_CACHE_DIR = ".api_cache"
+API_CACHE_TTL = 30 * 60  # seconds; career stats barely move minute to minute
+OVERFAST_RATE = 30  # requests per second allowed by Overfast
+RETRY_AFTER_MAX = 30.0  # seconds; longest we'll honour a server-requested wait
+
+# Client-side token bucket so bursts are throttled before Overfast answers 429
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_update) * self.rate)
+                self.last_update = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+@st.cache_resource
+def rate_limiter() -> TokenBucket:
+    # Shared by every session in this server process
+    return TokenBucket(rate=OVERFAST_RATE, capacity=OVERFAST_RATE)
+
+# urllib3 only accepts whole seconds or an HTTP-date in Retry-After and raises on anything
+# else; also accept fractional seconds, fall back to normal backoff on junk, and cap the
+# wait so a huge value can't park the script thread indefinitely.
+class OverfastRetry(Retry):
+    def parse_retry_after(self, retry_after: str) -> float:
+        try:
+            wait_s = float(retry_after)
+            if math.isfinite(wait_s):
+                return min(max(0.0, wait_s), RETRY_AFTER_MAX)
+        except ValueError:
+            pass
+        try:
+            return min(super().parse_retry_after(retry_after), RETRY_AFTER_MAX)
+        except InvalidHeader:
+            return self.get_backoff_time()
+
+@st.cache_resource
+def overfast_session() -> requests.Session:
+    # One pooled session per server process: keep-alive reuses the TLS connection
+    # across calls, and urllib3 handles 429/5xx backoff (honouring Retry-After).
+    session = requests.Session()
+    session.headers.update({"User-Agent": "OW-Stats-Streamlit/1.0"})
+    retry = OverfastRetry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=[429, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    return session
+
+@st.cache_resource
+def api_cache() -> diskcache.Cache:
+    # Disk-backed tier shared by all sessions and surviving server restarts
+    # tag_index lets Force refresh evict one player's entries without a full scan
+    return diskcache.Cache(API_CACHE_DIR, tag_index=True)
+
+def overfast_get(path: str, params=None, tag: str | None = None):
+    params = params or {}
+    key = hashlib.sha256(f"{path}?{json.dumps(params, sort_keys=True)}".encode()).hexdigest()
+    cache = api_cache()
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    rate_limiter().acquire()
+    r = overfast_session().get(f"{OVERFAST_BASE}{path}", params=params, timeout=20)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    cache.set(key, data, expire=API_CACHE_TTL, tag=tag)
+    return data
 
 def get_summary(player_id: str):
-    return overfast_get(f"/players/{player_id}/summary")
+    return overfast_get(f"/players/{player_id}/summary", tag=player_id)
 
 def get_stats(player_id: str, gamemode: str, platform: str | None, hero: str | None):
     params = {"gamemode": gamemode}
@@ -69,37 +193,161 @@ def get_stats(player_id: str, gamemode: str, platform: str | None, hero: str | N
         params["platform"] = platform
     if hero:
         params["hero"] = hero
-    return overfast_get(f"/players/{player_id}/stats", params=params)
+    return overfast_get(f"/players/{player_id}/stats", params=params, tag=player_id)
+
+def get_player(player_id: str, gamemode: str, platform: str | None, hero: str | None):
+    # Summary and stats are independent endpoints: fetch them concurrently so a
+    # cold lookup costs max(t_summary, t_stats) instead of the sum.
+    # Workers touch st.cache_resource helpers, so hand them this script run's context
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=2, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        summary = pool.submit(get_summary, player_id)
+        stats = pool.submit(get_stats, player_id, gamemode, platform, hero)
+        return summary.result(), stats.result()
 
 def ensure_snap_file():
+    if os.path.isdir(SNAP_DIR):
+        return
+    # Build the dataset (including any legacy migration) in a side directory and rename it
+    # into place only once complete, so a failed migration is retried on the next run
+    # instead of leaving an empty store in front of the old history.
     os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(SNAP_FILE):
-        df = pd.DataFrame(
-            columns=[
-                "timestamp",
-                "battletag",
-                "player_id",
-                "gamemode",
-                "platform",
-                "hero",
-                "games_played",
-                "games_won",
-                "games_lost",
-                "time_played_sec",
-                "eliminations",
-                "deaths",
-                "hero_damage_done",
-                "healing_done",
-            ]
-        )
-        df.to_csv(SNAP_FILE, index=False)
-
-def load_snaps():
+    tmp_dir = f"{SNAP_DIR}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(tmp_dir)
+    try:
+        # Seed an empty part so the dataset always has a schema to read
+        pq.write_table(SNAP_SCHEMA.empty_table(), os.path.join(tmp_dir, "part-0.parquet"))
+        if os.path.exists(LEGACY_SNAP_FILE):
+            # One-time migration from the old CSV store
+            # Explicit dtypes and no default NA sniffing: text stays text ("" for a blank
+            # platform), and only empty stat cells become NaN.
+            df = pd.read_csv(
+                LEGACY_SNAP_FILE,
+                usecols=SNAP_COLUMNS,
+                dtype={
+                    f.name: str if pa.types.is_string(f.type) else "float64"
+                    for f in SNAP_SCHEMA
+                    if f.name != "timestamp"
+                },
+                keep_default_na=False,
+                na_values={c: [""] for c in SNAP_STATS},
+            )
+            # The old writer's isoformat() drops the fraction when microseconds are 0, so forms mix
+            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce", format="ISO8601")
+            append_snaps(df, tmp_dir)
+        os.replace(tmp_dir, SNAP_DIR)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Another session finished creating the store first
+        if os.path.isdir(SNAP_DIR):
+            return
+        raise
+
+def load_snaps() -> pd.DataFrame:
     ensure_snap_file()
-    return pd.read_csv(SNAP_FILE)
+    # Hold the store lock so a compaction can't delete parts mid-read
+    with snap_store_lock():
+        tables = [pq.read_table(path, schema=SNAP_SCHEMA) for path in snap_files(SNAP_DIR)]
+    return apply_snap_dtypes(pa.concat_tables(tables).to_pandas())
+
+def apply_snap_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    # Counters are whole numbers in practice, but the float64 store can hold a stray
+    # fractional value (e.g. time played); round first so the Int32 cast can't fail.
+    counters = [c for c, t in SNAP_DTYPES.items() if t == "Int32" and c in df.columns]
+    df = df.assign(**{c: df[c].astype("float64").round() for c in counters})
+    return df.astype({c: t for c, t in SNAP_DTYPES.items() if c in df.columns})
+
+def snaps_mtime() -> float:
+    # Adding a part file bumps the directory mtime
+    ensure_snap_file()
+    return os.path.getmtime(SNAP_DIR)
+
+def snapshot_hashes(df: pd.DataFrame) -> pd.Series:
+    # Content hash of identity + stats (not the timestamp). Goes through apply_snap_dtypes
+    # first so freshly fetched floats and loaded Int32 values stringify the same.
+    cols = apply_snap_dtypes(df[SNAP_KEY + SNAP_STATS]).astype(object)
+    # Missing values hash as "" on every pandas version (astype(str) keeps NaN on pandas 3)
+    cols = cols.where(cols.notna(), "")
+    hashes = [
+        hashlib.blake2b("|".join(map(str, row)).encode(), digest_size=8).hexdigest()
+        for row in cols.itertuples(index=False)
+    ]
+    return pd.Series(hashes, index=df.index)
+
+# The one cached snapshot loader, keyed on the store's mtime so reruns skip the read and
+# sort until a save touches it. Newest first.
+@st.cache_data(ttl=600, show_spinner=False)
+def sorted_snaps(mtime: float) -> pd.DataFrame:
+    return load_snaps().sort_values("timestamp", ascending=False, ignore_index=True)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def build_history(mtime: float) -> pd.DataFrame:
+    # all-heroes snapshots with the derived trend columns, oldest first
+    df = sorted_snaps(mtime)
+    # Filter rows and narrow to the plotted columns in one step
+    df = df.loc[
+        (df["hero"] == "all-heroes") & df["timestamp"].notna(),
+        ["timestamp", "games_won", "games_lost", "time_played_sec"],
+    ]
+    # Back to plain floats for the trend math and Plotly (NaN rather than pd.NA)
+    df = df.astype({"games_won": "float64", "games_lost": "float64", "time_played_sec": "float64"})
+    total = df["games_won"] + df["games_lost"]
+    df["winrate"] = df["games_won"].div(total).where(total > 0)
+    df["time_min"] = df["time_played_sec"] / 60.0
+    return df.iloc[::-1]
+
+@st.cache_resource
+def snap_store_lock() -> threading.RLock:
+    # Serializes reads, appends and compaction across sessions in this server process
+    return threading.RLock()
+
+def write_part(table: pa.Table, snap_dir: str, prefix: str = "part"):
+    # Write under a dot-prefixed name and rename into place, so readers never see a partial file
+    name = f"{prefix}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp = os.path.join(snap_dir, f".{name}")
+    pq.write_table(table, tmp)
+    os.replace(tmp, os.path.join(snap_dir, name))
+
+def merged_parts(snap_dir: str) -> set[str]:
+    # Per-save parts already folded into a compacted file (recorded in its metadata)
+    merged = set()
+    for name in os.listdir(snap_dir):
+        if name.startswith("compact-"):
+            meta = pq.read_schema(os.path.join(snap_dir, name)).metadata or {}
+            merged.update(json.loads(meta.get(b"merged_parts", b"[]")))
+    return merged
+
+def snap_files(snap_dir: str) -> list[str]:
+    # Live data files: compacted files plus per-save parts not yet merged into one. Parts a
+    # crashed compaction failed to delete are skipped here, so rows are never counted twice.
+    merged = merged_parts(snap_dir)
+    return [
+        os.path.join(snap_dir, name)
+        for name in sorted(os.listdir(snap_dir))
+        if name.startswith("compact-") or (name.startswith("part-") and name not in merged)
+    ]
 
-def save_snaps(df: pd.DataFrame):
-    df.to_csv(SNAP_FILE, index=False)
+def compact_snaps(snap_dir: str):
+    # Merge only the small per-save parts into a new compacted file; earlier compacted files
+    # are left alone, so compaction cost is bounded by SNAP_COMPACT_AT parts, not the history.
+    merged = merged_parts(snap_dir)
+    for name in os.listdir(snap_dir):
+        if name in merged:
+            os.remove(os.path.join(snap_dir, name))
+    parts = sorted(name for name in os.listdir(snap_dir) if name.startswith("part-"))
+    paths = [os.path.join(snap_dir, name) for name in parts]
+    table = pa.concat_tables([pq.read_table(path, schema=SNAP_SCHEMA) for path in paths])
+    write_part(table.replace_schema_metadata({"merged_parts": json.dumps(parts)}), snap_dir, "compact")
+    for path in paths:
+        os.remove(path)
+
+def append_snaps(df: pd.DataFrame, snap_dir: str = SNAP_DIR):
+    # Write cost is O(rows added), plus an occasional merge of the last SNAP_COMPACT_AT parts
+    table = pa.Table.from_pandas(df[SNAP_COLUMNS], schema=SNAP_SCHEMA, preserve_index=False)
+    with snap_store_lock():
+        write_part(table, snap_dir)
+        if sum(name.startswith("part-") for name in os.listdir(snap_dir)) > SNAP_COMPACT_AT:
+            compact_snaps(snap_dir)
 
 def _to_number(x):
     if x is None:
@@ -140,39 +388,43 @@ def _to_number(x):
 
 
 def pluck_num(d, *keys):
-    cur = d
-    for k in keys:
-        if not isinstance(cur, dict) or k not in cur:
-            return None
-        cur = cur[k]
-    return _to_number(cur)
+    # EAFP walk: the keys are almost always present, so skip per-level type/membership checks
+    try:
+        for k in keys:
+            d = d[k]
+    except (KeyError, TypeError, IndexError):
+        return None
+    return _to_number(d)
+
+CAREER_FIELDS = {
+    "games_played": ("game", "games_played"),
+    "games_won": ("game", "games_won"),
+    "games_lost": ("game", "games_lost"),
+    "time_played_sec": ("game", "time_played"),
+    "eliminations": ("combat", "eliminations"),
+    "deaths": ("combat", "deaths"),
+    "hero_damage_done": ("combat", "hero_damage_done"),
+    "healing_done": ("assists", "healing_done"),
+}
 
 def career_to_table(career_json: dict) -> pd.DataFrame:
     # career_json: { "all-heroes": {...}, "ana": {...}, ... }
-    rows = []
-    for hero_key, h in career_json.items():
-        rows.append(
-            {
-                "hero": hero_key,
-                "games_played": pluck_num(h, "game", "games_played"),
-                "games_won": pluck_num(h, "game", "games_won"),
-                "games_lost": pluck_num(h, "game", "games_lost"),
-                "time_played_sec": pluck_num(h, "game", "time_played"),
-                "eliminations": pluck_num(h, "combat", "eliminations"),
-                "deaths": pluck_num(h, "combat", "deaths"),
-                "hero_damage_done": pluck_num(h, "combat", "hero_damage_done"),
-                "healing_done": pluck_num(h, "assists", "healing_done"),
-            }
-        )
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return df
-    df["winrate"] = df.apply(
-        lambda r: (r["games_won"] / (r["games_won"] + r["games_lost"]))
-        if pd.notna(r["games_won"]) and pd.notna(r["games_lost"]) and (r["games_won"] + r["games_lost"]) > 0
-        else None,
-        axis=1,
-    )
+    heroes = list(career_json.keys())
+    if not heroes:
+        return pd.DataFrame()
+    blobs = [career_json[h] for h in heroes]
+    # Categorical hero column so equality filters compare int codes, not strings.
+    # Heroes the API knows about but ALL_HEROES doesn't yet are appended, not dropped.
+    extra = [h for h in heroes if h not in ALL_HEROES_SET]
+    cols = {"hero": pd.Categorical(heroes, categories=ALL_HEROES + extra)}
+    # Build each column as a float array up front (None -> NaN) so everything below stays vectorized
+    for col, keys in CAREER_FIELDS.items():
+        cols[col] = np.array([pluck_num(b, *keys) for b in blobs], dtype=float)
+    df = pd.DataFrame(cols)
+
+    # Vectorized winrate: NaN when either side is missing or no games were decided
+    total = df["games_won"] + df["games_lost"]
+    df["winrate"] = df["games_won"].div(total).where(total > 0)
     df["time_played_min"] = df["time_played_sec"] / 60.0
     return df
 
@@ -184,6 +436,7 @@ with st.sidebar:
     gamemode = st.selectbox("Mode", ["competitive", "quickplay"], index=0)
     platform = st.selectbox("Platform (optional)", ["", "pc", "console"], index=0)
     hero = st.text_input("Hero filter (optional)", placeholder="e.g., ana (blank = all)")
+    force_refresh = st.checkbox("Force refresh", help="Ignore cached API responses for this player.")
 
     fetch = st.button("Fetch", type="primary")
     st.divider()
@@ -192,17 +445,14 @@ with st.sidebar:
 
     st.caption("If your Overwatch profile is private, third-party sources usually can't read stats.")
 
-snaps = load_snaps()
+snaps_version = snaps_mtime()
+snaps = sorted_snaps(snaps_version)
 
 import streamlit as st
 
-@st.cache_data(ttl=60)
-def cached_summary(pid: str):
-    return get_summary(pid)
-
-@st.cache_data(ttl=60)
-def cached_stats(pid: str, gamemode: str, platform: str | None, hero: str | None):
-    return get_stats(pid, gamemode, platform, hero)
+@st.cache_data(ttl=API_CACHE_TTL, max_entries=128, show_spinner=False)
+def cached_player(pid: str, gamemode: str, platform: str | None, hero: str | None):
+    return get_player(pid, gamemode, platform, hero)
 # State
 if "summary" not in st.session_state:
     st.session_state.summary = None
@@ -216,7 +466,6 @@ if fetch:
         st.session_state.last_fetch = 0.0
 
     cooldown = 5  # seconds
-    import time
 
     if time.time() - st.session_state.last_fetch < cooldown:
         st.warning("Please wait a few seconds before fetching again.")
@@ -228,9 +477,13 @@ if fetch:
         st.error("Enter a BattleTag first.")
     else:
         pid = battletag_to_player_id(battletag)
+        lookup = (pid, gamemode, platform or None, hero.strip() or None)
+        if force_refresh:
+            # Drop only this lookup, not every user's cached entries
+            cached_player.clear(*lookup)
+            api_cache().evict(pid)
         try:
-            summary = cached_summary(pid)
-            stats = cached_stats(pid, gamemode, platform or None, hero.strip() or None)
+            summary, stats = cached_player(*lookup)
             table = career_to_table(stats)
 
             st.session_state.summary = summary
@@ -265,27 +518,27 @@ def do_save(df_to_save: pd.DataFrame):
     if df_to_save.empty or not st.session_state.pid:
         st.warning("Fetch stats first.")
         return
-    now = datetime.now(timezone.utc).isoformat()
-    pid = st.session_state.pid
-    bt = battletag
-    plat = platform or ""
-    df_out = df_to_save.copy()
-    df_out["timestamp"] = now
-    df_out["battletag"] = bt
-    df_out["player_id"] = pid
-    df_out["gamemode"] = gamemode
-    df_out["platform"] = plat
-
-    # Keep only snapshot columns
-    keep = [
-        "timestamp","battletag","player_id","gamemode","platform","hero",
-        "games_played","games_won","games_lost","time_played_sec",
-        "eliminations","deaths","hero_damage_done","healing_done"
-    ]
-    df_out = df_out[keep]
-
-    updated = pd.concat([snaps, df_out], ignore_index=True)
-    save_snaps(updated)
+    meta = {
+        "timestamp": pd.Timestamp.now(tz="UTC"),
+        "battletag": battletag,
+        "player_id": st.session_state.pid,
+        "gamemode": gamemode,
+        "platform": platform or "",
+    }
+    # One allocation: add the metadata columns and keep only snapshot columns
+    df_out = df_to_save.assign(**meta)[SNAP_COLUMNS]
+
+    # Skip rows identical to the latest saved row for the same player/mode/platform/hero
+    # (snaps is newest first, so the first row per key is the latest)
+    mine = snaps[snaps["player_id"] == meta["player_id"]]
+    if not mine.empty:
+        latest = mine.drop_duplicates(SNAP_KEY, keep="first")
+        df_out = df_out[~snapshot_hashes(df_out).isin(set(snapshot_hashes(latest)))]
+        if df_out.empty:
+            st.info("No changes since the last snapshot; nothing saved.")
+            return
+
+    append_snaps(df_out)
     st.success("Snapshot saved!")
 
 if save_all:
@@ -302,6 +555,11 @@ if save_view:
     else:
         st.warning("Fetch stats first.")
 
+# Pick up a save from this run; the table and the charts below share this one store version
+if save_all or save_view:
+    snaps_version = snaps_mtime()
+    snaps = sorted_snaps(snaps_version)
+
 # Tabs
 tab1, tab2 = st.tabs(["Heroes", "History"])
 
@@ -325,28 +583,25 @@ with tab2:
     if snaps.empty:
         st.info("No snapshots yet.")
     else:
-        st.dataframe(snaps.sort_values("timestamp", ascending=False), use_container_width=True)
+        # Only ship the newest rows to the browser; the full history can get large
+        # Fixed bounds and a key so the choice survives saves that change len(snaps)
+        n_rows = int(
+            st.number_input("Rows to show", min_value=10, value=200, step=50, key="history_rows")
+        )
+        st.dataframe(snaps.head(n_rows), use_container_width=True)
+        st.caption(f"Showing the latest {min(n_rows, len(snaps))} of {len(snaps)} snapshot rows.")
 
-        df = snaps.copy()
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-        df_all = df[df["hero"] == "all-heroes"].dropna(subset=["timestamp"])
+        df_all = build_history(snaps_version)
 
         if len(df_all) >= 2:
-            df_all["winrate"] = df_all.apply(
-                lambda r: (r["games_won"] / (r["games_won"] + r["games_lost"]))
-                if pd.notna(r["games_won"]) and pd.notna(r["games_lost"]) and (r["games_won"] + r["games_lost"]) > 0
-                else None,
-                axis=1,
-            )
             c1, c2 = st.columns(2)
 
             with c1:
-                fig = px.line(df_all.sort_values("timestamp"), x="timestamp", y="winrate", markers=True)
+                fig = px.line(df_all, x="timestamp", y="winrate", markers=True)
                 st.plotly_chart(fig, use_container_width=True)
 
             with c2:
-                df_all["time_min"] = df_all["time_played_sec"] / 60.0
-                fig = px.line(df_all.sort_values("timestamp"), x="timestamp", y="time_min", markers=True)
+                fig = px.line(df_all, x="timestamp", y="time_min", markers=True)
                 st.plotly_chart(fig, use_container_width=True)
         else:
             st.caption("Add at least 2 all-heroes snapshots to see trends.")